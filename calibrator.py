@@ -6,7 +6,21 @@ Updated on Mar 21, 2016
 '''
 
 import inspect
-from difflib import SequenceMatcher
+
+# Optional: rapidfuzz scores names in C instead of Python. _get_best_shot and
+# calibrate_batch both score with _similarity so that their results agree.
+try:
+    from rapidfuzz.distance import Indel as _Indel
+    _similarity = _Indel.normalized_similarity
+except ImportError:
+    _similarity = None
+
+# Optional: with numpy too, rapidfuzz scores whole batches of names at once
+try:
+    import numpy
+    from rapidfuzz.process import cdist as _cdist
+except ImportError:
+    _cdist = None
 
 class Calibrator(object):
     """
@@ -16,68 +30,210 @@ class Calibrator(object):
         
     def _get_spellings(self, base: str) -> list:
         """
-        Yield the segments of base of each possible length.
+        Yield the uppercase segments of base of each possible length.
         """
         
+        # Signaturize as uppercase once; the slices inherit it
+        base = base.upper()
+        
         for i in range(len(base), 0, -1):
             yield(base[:i])
             
         
-    def _get_best_shot(self, word: str, opts: list) -> float:
+    def _lcs_ratio(self, a: str, b: str, cutoff: float=0.0) -> float:
+        """
+        Return the similarity of a and b as 2 * LCS / (len(a) + len(b)), where
+        LCS is the length of their longest common subsequence (the measure
+        SequenceMatcher's ratio approximates). Return 0.0 as soon as it is
+        certain not to beat cutoff.
+        """
+        
+        # Make b the shorter string so the rows stay small
+        if len(a) < len(b):
+            a, b = b, a
+        total = len(a) + len(b)
+        if not total:
+            return 1.0
+        
+        # A prefix is its own LCS; no table needed. Every score is taken as
+        # 1 - distance / total so that equal distances give equal floats.
+        if a.startswith(b):
+            return 1 - (total - 2 * len(b)) / total
+        
+        # Distance beyond which the ratio can no longer exceed the cutoff
+        limit = (1 - cutoff) * total
+        
+        prev = [0] * (len(b) + 1)
+        for i, ca in enumerate(a, 1):
+            curr = [0]
+            for j, cb in enumerate(b, 1):
+                if ca == cb:
+                    curr.append(prev[j - 1] + 1)
+                else:
+                    curr.append(max(prev[j], curr[j - 1]))
+            
+            # Even if every remaining char matched, could it still beat it?
+            best_lcs = min(len(b), curr[-1] + len(a) - i)
+            if total - 2 * best_lcs > limit:
+                return 0.0
+            prev = curr
+        
+        return 1 - (total - 2 * prev[-1]) / total
+    
+    
+    def _get_best_shot(self, word: str, opts: tuple,
+                       cutoff: float=0.0) -> float:
         """
         Return the highest similarity score of any string in opts when
-        compared to word.
+        compared to word, or cutoff if none beats it. Both are expected to be
+        uppercase already.
         """
         
-        # Signaturize as uppercase
-        word = word.upper()
-        opts = [opt.upper() for opt in opts]
+        # Each score becomes the cutoff for the rest, so most abort early
+        best = cutoff
+        if _similarity:
+            for opt in opts:
+                score = _similarity(word, opt, score_cutoff=best)
+                best = max(best, score)
+        else:
+            for opt in opts:
+                best = max(best, self._lcs_ratio(word, opt, best))
         
-        return max([SequenceMatcher(None, word, opt).ratio() for opt in opts])
+        return best
     
     
-    def calibrate_args(self, actual: list, expected: list) -> dict:
+    def _match_spellings(self, actual: list, expected: list) -> tuple:
         """
-        Return a dictionary representing the best guess at a correspondence
-        between the expected argument names and the actual ones.
+        Match the actual argument names that are possible spellings of the
+        expected ones. Return the key so far, the set of names assigned, and
+        the list of args left unused.
         """
         
-        # Initialize the eventual key and a dict of names to possible spellings
-        key = {name: '' for name in expected}
-        name_to_spellings = {name: list(self._get_spellings(name)) \
-                             for name in expected}
+        # Any expected name used verbatim is matched directly. When that covers
+        # every name (the usual case), there is nothing left to guess.
+        actual_set = set(actual)
+        key = {name: name if name in actual_set else '' for name in expected}
+        if actual_set.issuperset(key):
+            return key, set(key), []
+        
+        # Track which names have a match and which args have been used
+        assigned = {name for name in expected if key[name]}
+        used = set(assigned)
+        
+        # Index every spelling of the remaining names by the name it belongs
+        # to. Where two names share a spelling, the first expected name keeps
+        # it.
+        spelling_to_name = {}
+        for name in key:
+            if name not in assigned:
+                for spelling in self._get_spellings(name):
+                    spelling_to_name.setdefault(spelling, name)
         
         # Do the initial matching: if the argument matches a possible spelling
         # of a given name, assign it to that.
         
         for arg in actual:
-            for name, spellings in name_to_spellings.items():
-                
-                u_arg = arg.upper()
-                u_spellings = [w.upper() for w in spellings]
-                
-                if u_arg in u_spellings:
-                    key[name] = arg
-                    break
+            if arg in used:
+                continue
+            name = spelling_to_name.get(arg.upper())
+            if name and name not in assigned:
+                key[name] = arg
+                assigned.add(name)
+                used.add(arg)
+        
+        unused_args = [arg for arg in actual if arg not in used]
+        return key, assigned, unused_args
+    
+    
+    def calibrate_args(self, actual: list, expected: list) -> dict:
+        """
+        Return a dictionary representing the best guess at a correspondence
+        between the expected argument names and the actual ones.
+        """
+        
+        key, assigned, unused_args = self._match_spellings(actual, expected)
         
         # For any args that weren't a possible spelling of a known name,
-        # assign each to the name that (a) the arg is most similar to and
-        # (b) doesn't already have a match.
+        # assign each to the most similar name that is still free. Only the
+        # free names need their spellings spelled out.
+        
+        free = [name for name in key if name not in assigned]
+        if not (unused_args and free):
+            return key
         
-        unused_args = [arg for arg in actual if arg not in key.values()]
+        name_to_upper_spellings = {name: tuple(self._get_spellings(name)) \
+                                   for name in free}
         for arg in unused_args:
-            sims = {name: self._get_best_shot(arg, spellings) \
-                    for (name, spellings) in name_to_spellings.items()}
-            sims = sorted(sims.items(), key=lambda x: x[1], reverse=True)
+            if not free:
+                break
+            u_arg = arg.upper()
+            
+            # Keep the first of the most similar names. The best score so far
+            # is the cutoff for the rest, so weaker names are abandoned early.
+            best_name, best = free[0], 0.0
+            for name in free:
+                spellings = name_to_upper_spellings[name]
+                shot = self._get_best_shot(u_arg, spellings, best)
+                if shot > best:
+                    best_name, best = name, shot
             
-            for name, _ in sims:
-                if not key[name]:
-                    key[name] = arg
-                    break
+            key[best_name] = arg
+            free.remove(best_name)
         
         return key
     
     
+    def calibrate_batch(self, actuals: list, expected: list) -> list:
+        """
+        Return a list of the calibrate_args results for each list of actual
+        argument names in actuals against the same expected names.
+        
+        If rapidfuzz is installed, the similarity scores for the whole batch
+        are computed together in one call.
+        """
+        
+        if _cdist is None:
+            return [self.calibrate_args(actual, expected) \
+                    for actual in actuals]
+        
+        matches = [self._match_spellings(actual, expected) \
+                   for actual in actuals]
+        
+        # Flatten every leftover arg across the batch
+        queries = [arg.upper() for match in matches for arg in match[2]]
+        if not queries:
+            return [match[0] for match in matches]
+        
+        # Flatten the spellings of every name, noting where each name starts.
+        # Names with no spellings (i.e. empty ones) are left out and score 0.
+        names = [name for name in dict.fromkeys(expected) if name]
+        choices, starts = [], []
+        for name in names:
+            starts.append(len(choices))
+            choices.extend(self._get_spellings(name))
+        
+        # Score everything at once, then take each name's best spelling
+        if names:
+            scores = _cdist(queries, choices, scorer=_similarity,
+                            dtype=numpy.float64)
+            best_shots = numpy.maximum.reduceat(scores, starts, axis=1)
+        else:
+            best_shots = numpy.zeros((len(queries), 0))
+        
+        # Assign greedily within each submission, as calibrate_args does
+        rows = iter(best_shots)
+        for key, assigned, unused_args in matches:
+            free = [name for name in key if name not in assigned]
+            for arg in unused_args:
+                sims = dict(zip(names, next(rows).tolist()))
+                if free:
+                    best_name = max(free, key=lambda n: sims.get(n, 0.0))
+                    key[best_name] = arg
+                    free.remove(best_name)
+        
+        return [match[0] for match in matches]
+    
+    
     def calibrate_fn(self, fn: callable, expected: list) -> dict:
         """
         Return a dictionary representing the best guess at a correspondence
@@ -129,5 +129,5 @@ def deserialize_location(location_str):
     @rtype: Location
     """
     # TODO
-    return Location(int(location_str.split(",")[0]),
-                    int(location_str.split(",")[1]))
+    row, col = location_str.split(",", 1)
+    return Location(int(row), int(col))
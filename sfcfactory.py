@@ -50,8 +50,10 @@ Demonstrations of how to use these extensible classes can be found in demos.py.
 #===============================================================================
 
 from sfc.calibrator import Calibrator
-from random import sample
+from functools import lru_cache
 import inspect
+import sys
+import weakref
 
 #===============================================================================
 # CONSTANTS
@@ -60,11 +62,30 @@ import inspect
 # Some functions are constructors for objects. They need an argument passed for
 # the type definition to be properly instantiated. This constant gives a name
 # reserved for that argument (should be guaranteed unique and impossible to
-# mis-identify as any actual argument).
-STYPE_ARG = '_sfc_stype_arg_' + ''.join(sample([str(n) for n in range(99)], 9))
+# mis-identify as any actual argument). It is interned for fast lookups.
+STYPE_ARG = sys.intern('_sfc_stype_arg_')
 
 # Similar for a self object in the case of member functions.
-SSELF_ARG = '_sfc_sself_arg_' + ''.join(sample([str(n) for n in range(99)], 9))
+SSELF_ARG = sys.intern('_sfc_sself_arg_')
+
+#===============================================================================
+# HELPERS
+#===============================================================================
+
+@lru_cache(maxsize=64)
+def _invert_tester_names(c: Calibrator, shape: tuple, required: tuple) -> dict:
+    """
+    Return a dictionary of the names in shape to the required names that c
+    matches them with. These don't depend on the student, so every caller
+    class with the same required names shares the result; don't mutate it.
+    """
+    
+    tester_names = c.calibrate_args(list(shape), required)
+    return {v: k for k, v in tester_names.items()}
+
+# Uninstantiated child classes already made, by the student type they stand
+# for. Weakly keyed so each student's class can be freed after grading.
+_uninstantiated_types = weakref.WeakKeyDictionary()
 
 #===============================================================================
 # FACTORY API
@@ -77,29 +98,47 @@ class SFCFactory(object):
     """
 
     @staticmethod
-    def sfc(name: str, sfn: callable, required: list=[], possible: dict={}):
+    def _intern_params(required: list, possible: dict) -> tuple:
+        """
+        Return required as a tuple and possible as a new dict, with all the
+        parameter names interned.
+        """
+        
+        required = tuple(sys.intern(n) for n in required) if required else ()
+        possible = {sys.intern(n): v for n, v in possible.items()} \
+                   if possible else {}
+        return required, possible
+
+    @staticmethod
+    def sfc(name: str, sfn: callable, required: list=None,
+            possible: dict=None):
         """
         Return a child of StudentFunctionCaller for the given student function.
         """
         
+        required, possible = SFCFactory._intern_params(required, possible)
         namespace = {'sfn': sfn, 'required': required, 'possible': possible}
         return type(name, (StudentFunctionCaller,), namespace)
     
     @staticmethod
-    def smc(name: str, sfn: callable, required: list=[], possible: dict={}):
+    def smc(name: str, sfn: callable, required: list=None,
+            possible: dict=None):
         """
         Return a child of StudentMethodCaller for the given student method.
         """
         
+        required, possible = SFCFactory._intern_params(required, possible)
         namespace = {'sfn': sfn, 'required': required, 'possible': possible}
         return type(name, (StudentMethodCaller,), namespace)
     
     @staticmethod
-    def som(name: str, stype: type, required: list=[], possible: dict={}):
+    def som(name: str, stype: type, required: list=None,
+            possible: dict=None):
         """
         Return a child of StudentObjectMaker for the given student class.
         """
         
+        required, possible = SFCFactory._intern_params(required, possible)
         namespace = {'stype': stype, 'required': required, 'possible': possible}
         return type(name, (StudentObjectMaker,), namespace)
 
@@ -125,14 +164,24 @@ class StudentFunctionCaller(object):
     
     @staticmethod
     def sfn(**kwargs): pass
-    required = []
+    required = ()
     possible = {}
+    all_params = ()
     
     # Added 1.1.1: optional separate function just for inspecting, not calling
     
     sfn_inspect = None
     
     
+    def __init_subclass__(cls, **kwargs):
+        """
+        Fix the full parameter list for a child class, once.
+        """
+        
+        super().__init_subclass__(**kwargs)
+        cls.all_params = tuple(cls.required) + tuple(cls.possible)
+    
+    
     def call(self, *args, **kwargs) -> object:
         """
         Call the student function with the keyword arguments from the caller.
@@ -146,36 +195,74 @@ class StudentFunctionCaller(object):
             sobj = kwargs.pop(SSELF_ARG)
             kwargs['self'] = sobj
         
-        # Get student versions of names        
-        all_params = self.required + list(self.possible.keys())
-        
-        #  Use the special inspect-only function if it has been specified
-        if self.sfn_inspect:
-            student_names = self.c.calibrate_fn(self.sfn_inspect, all_params)
-        else:
-            student_names = self.c.calibrate_fn(self.sfn, all_params)
+        # Calibration depends only on class-level values, so it is done once
+        # per child class and stored on it
+        cls = type(self)
         
-        # Match the names this function was called with against required names
-        tester_names = self.c.calibrate_args(list(kwargs.keys()),self.required)
-        tester_names = {v: k for k, v in tester_names.items()}
+        #  Use the special inspect-only function if it has been specified.
+        # Read it live, since either function may be reassigned on the class.
+        inspect_fn = cls.sfn_inspect or cls.sfn
         
-        # Prepare the kwargs we'll create the student object with
-        student_kwargs = {}
-        
-        # Prepare the required parameters
-        for argn, argv in kwargs.items():
-            tester_name = tester_names[argn]
-            student_name = student_names[tester_name]
-            student_kwargs[student_name] = argv
+        # Get student versions of names (again if the inspected function moved)
+        cached = cls.__dict__.get('_cached_student_names')
+        if not cached or cached[0] is not inspect_fn:
+            student_names = self.c.calibrate_fn(inspect_fn, self.all_params)
+            
+            # Prepare the possible parameters, which have default values
+            defaults = {student_names[name]: default_value \
+                        for name, default_value in self.possible.items() \
+                        if student_names.get(name)}
+            
+            cached = (inspect_fn, student_names, defaults)
+            cls._cached_student_names = cached
+            cls._cached_callers = {}
+        student_names, defaults = cached[1:]
         
-        # Prepare the possible parameters, which have default values
-        for name, default_value in self.possible.items():
-            if student_names.get(name):
-                student_kwargs[student_names.get(name)] = default_value
+        # Map the names this function was called with straight to the student's
+        # names, going through the required names they match. Each shape of
+        # call gets its own caller with the mapping compiled in.
+        shape = tuple(kwargs)
+        caller = cls._cached_callers.get(shape)
+        if caller is None:
+            tester_names = _invert_tester_names(self.c, shape,
+                                                tuple(self.required))
+            arg_map = {argn: student_names[tester_names[argn]] \
+                       for argn in shape}
+            caller = self._compile_caller(arg_map, defaults)
+            cls._cached_callers[shape] = caller
         
         # Call using the derived arguments
         # The client of this class is responsible for handling a TypeError!
-        return type(self).sfn(**student_kwargs)
+        return caller(type(self).sfn, kwargs)
+    
+    
+    @staticmethod
+    def _compile_caller(arg_map: dict, defaults: dict) -> 'function':
+        """
+        Return a function taking the student function and the caller's kwargs
+        that calls the former with the latter renamed according to arg_map,
+        plus the defaults for possible parameters.
+        """
+        
+        # Build the student kwargs as source, with defaults winning on clashes
+        sources = {}
+        for argn, student_name in arg_map.items():
+            sources[student_name] = 'kw[{!r}]'.format(argn)
+        for student_name in defaults:
+            sources[student_name] = 'defaults[{!r}]'.format(student_name)
+        
+        # Names that can't be keywords (i.e. unmatched ones) go in a dict
+        args = ['{}={}'.format(n, v) for n, v in sources.items() \
+                if n.isidentifier()]
+        extras = ['{!r}: {}'.format(n, v) for n, v in sources.items() \
+                  if not n.isidentifier()]
+        if extras:
+            args.append('**{' + ', '.join(extras) + '}')
+        
+        source = 'def caller(sfn, kw):\n    return sfn({})\n'
+        namespace = {'defaults': defaults}
+        exec(source.format(', '.join(args)), namespace)
+        return namespace['caller']
             
 #===============================================================================
 # STUDENTMETHODCALLER
@@ -187,14 +274,16 @@ class StudentMethodCaller(StudentFunctionCaller):
     There is no need to pass 'self' as a required argument.
     '''
     
-    def __init__(self):
+    def __init_subclass__(cls, **kwargs):
         """
-        Add 'self' to the required argument list if it was not included.
+        Add 'self' to the required argument list of a child class if it was
+        not included.
         """
         
-        # Add the self instance arg to the required list if it's not included
-        if 'self' not in self.required:
-            self.required.append('self')
+        if 'self' not in cls.required:
+            cls.required = tuple(cls.required) + ('self',)
+        
+        super().__init_subclass__(**kwargs)
         
 
     def call(self, sobj, **kwargs) -> object:
@@ -227,28 +316,40 @@ class StudentObjectMaker(StudentFunctionCaller):
     # Abstract for the real value defined in child classes
     stype = type(None)
     
-
-    def __init__(self):
+    
+    def __init_subclass__(cls, **kwargs):
         """
-        Prepare the uninstantiated object and the instantiator for the student
-        object, and add the student type argument to the required list.
+        Register the instantiator and the inspect-only __init__ for a child
+        class, once, unless it already has them.
         """
         
-        # Save the type, create uninstantiated version
-        self.uobj = self._get_uninstantiated_object()
+        # Instantiate the StudentFunctionCaller with the initiator
+        if 'sfn' not in cls.__dict__:
+            cls.sfn = staticmethod(cls._get_instantiator())
         
         # Register the inspect-only __init__ (our initiator has a different
         # signature and hence cannot be inspected for its parameter names)
-        self.sfn_inspect = self.stype.__init__
-        
-        # Instantiate the StudentFunctionCaller with the initiator
-        type(self).sfn = self._get_instantiator()
+        if 'sfn_inspect' not in cls.__dict__:
+            cls.sfn_inspect = cls.stype.__init__
         
         # Add the class type arg to the required list
-        self.required.append(STYPE_ARG)
+        if STYPE_ARG not in cls.required:
+            cls.required = tuple(cls.required) + (STYPE_ARG,)
+        
+        super().__init_subclass__(**kwargs)
+    
+
+    def __init__(self):
+        """
+        Prepare the uninstantiated object for the student object.
+        """
+        
+        # Save the type, create uninstantiated version
+        self.uobj = self._get_uninstantiated_object()
         
     
-    def _get_instantiator(self) -> 'function':
+    @staticmethod
+    def _get_instantiator() -> 'function':
         """
         Create a function that can instantiate and return the student object
         (__init__ does not return).
@@ -256,8 +357,7 @@ class StudentObjectMaker(StudentFunctionCaller):
         
         # The student type will end up being passed as an argument named 'self'
         def ins(**kwargs):
-            stype = kwargs['self']
-            del kwargs['self']
+            stype = kwargs.pop('self')
             return stype(**kwargs)
         
         return ins
@@ -271,13 +371,13 @@ class StudentObjectMaker(StudentFunctionCaller):
         """
                 
         # Get the name for the dynamic class
-        typestr = str(self.stype)        
-        start = typestr.rfind("class '") + 7
-        end = typestr.rfind("'")
-        name = typestr[start:end]
+        name = self.stype.__name__
         
-        # Create the dynamic class
-        utype = type('Uninstantiated' + name, (Uninstantiated,), {})
+        # Create the dynamic class, only once per student type
+        utype = _uninstantiated_types.get(self.stype)
+        if utype is None:
+            utype = type('Uninstantiated' + name, (Uninstantiated,), {})
+            _uninstantiated_types[self.stype] = utype
         
         # Instantiate
         return utype(name)